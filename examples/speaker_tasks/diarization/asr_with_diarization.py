@@ -61,6 +61,8 @@ params = {
     "external_oracle_vad": True if args.oracle_vad_manifest else False,
     "diar_config_url": args.diar_config_url,
     "ASR_model_name": 'QuartzNet15x5Base-En',
+    "asr_batch_size": 8,  # Number of audio files transcribed together.
+    "num_workers": 1,  # Number of processes used to post-process the audio files.
 }
 
 asr_diar_offline = ASR_DIAR_OFFLINE(params)
@@ -15,14 +15,45 @@
 from typing import List
 
 import editdistance
+import numpy as np
 import torch
 from torchmetrics import Metric
 
 from nemo.collections.asr.parts.utils.rnnt_utils import Hypothesis
 from nemo.utils import logging
 
+try:
+    from rapidfuzz.distance import Levenshtein
+
+    HAVE_RAPIDFUZZ = True
+except (ImportError, ModuleNotFoundError):
+    HAVE_RAPIDFUZZ = False
+
+try:
+    from rapidfuzz.process import cpdist
+
+    HAVE_RAPIDFUZZ_CPDIST = HAVE_RAPIDFUZZ
+except (ImportError, ModuleNotFoundError):
+    HAVE_RAPIDFUZZ_CPDIST = False
+
 __all__ = ['word_error_rate', 'WER']
 
+# rapidfuzz computes the Levenshtein distance with a bit-parallel algorithm, editdistance is used as a fallback.
+# Both accept strings (character level) and lists of words (word level).
+_edit_distance = Levenshtein.distance if HAVE_RAPIDFUZZ else editdistance.eval
+
+
+def _sum_edit_distances(hypotheses: List, references: List) -> int:
+    """
+    Sums the Levenshtein distances between the paired hypotheses and references, which are either strings
+    (character level) or lists of words (word level). With a recent rapidfuzz, all the pairs are scored in a
+    single call without the GIL. It runs in the calling thread: with DDP every rank computes the metric, and
+    one thread per core in each rank would oversubscribe the CPU.
+    """
+    if HAVE_RAPIDFUZZ_CPDIST:
+        return int(cpdist(hypotheses, references, scorer=Levenshtein.distance, workers=1).sum())
+    return sum(_edit_distance(h, r) for h, r in zip(hypotheses, references))
+
 
 def word_error_rate(hypotheses: List[str], references: List[str], use_cer=False) -> float:
     """
@@ -44,15 +75,12 @@ def word_error_rate(hypotheses: List[str], references: List[str], use_cer=False)
             " lists must have the same number of elements. But I got:"
             "{0} and {1} correspondingly".format(len(hypotheses), len(references))
         )
-    for h, r in zip(hypotheses, references):
-        if use_cer:
-            h_list = list(h)
-            r_list = list(r)
-        else:
-            h_list = h.split()
-            r_list = r.split()
-        words += len(r_list)
-        scores += editdistance.eval(h_list, r_list)
+    if use_cer:
+        h_lists, r_lists = hypotheses, references
+    else:
+        h_lists, r_lists = [h.split() for h in hypotheses], [r.split() for r in references]
+    words += sum(map(len, r_lists))
+    scores += _sum_edit_distances(h_lists, r_lists)
     if words != 0:
         wer = 1.0 * scores / words
     else:
@@ -108,6 +136,8 @@ class WER(Metric):
         self.batch_dim_index = batch_dim_index
         self.blank_id = len(vocabulary)
         self.labels_map = dict([(i, vocabulary[i]) for i in range(len(vocabulary))])
+        # Array version of labels_map, so that a whole sequence of token ids is decoded with a single `take`
+        self._vocab_arr = np.array(list(vocabulary) + [''], dtype=object)
         self.use_cer = use_cer
         self.ctc_decode = ctc_decode
         self.log_prediction = log_prediction
@@ -141,16 +171,12 @@ class WER(Metric):
         prediction_cpu_tensor = predictions.long().cpu()
         # iterate over batch
         for ind in range(prediction_cpu_tensor.shape[self.batch_dim_index]):
-            prediction = prediction_cpu_tensor[ind].detach().numpy().tolist()
+            prediction = prediction_cpu_tensor[ind].detach()
             if predictions_len is not None:
                 prediction = prediction[: predictions_len[ind]]
-            # CTC decoding procedure
-            decoded_prediction = []
-            previous = self.blank_id
-            for p in prediction:
-                if (p != previous or previous == self.blank_id) and p != self.blank_id:
-                    decoded_prediction.append(p)
-                previous = p
+            # CTC decoding procedure: merge the repeated labels, then remove the blanks
+            merged_prediction = torch.unique_consecutive(prediction)
+            decoded_prediction = merged_prediction[merged_prediction != self.blank_id].tolist()
 
             text = self.decode_tokens_to_str(decoded_prediction)
 
@@ -161,7 +187,7 @@ class WER(Metric):
                     y_sequence=None,
                     score=-1.0,
                     text=text,
-                    alignments=prediction,
+                    alignments=prediction.tolist(),
                     length=predictions_len[ind] if predictions_len is not None else 0,
                 )
 
@@ -192,7 +218,8 @@ class WER(Metric):
         Returns:
             A list of decoded tokens.
         """
-        token_list = [self.labels_map[c] for c in tokens if c != self.blank_id]
+        tokens = np.asarray(tokens, dtype=np.int64)
+        token_list = self._vocab_arr.take(tokens[tokens != self.blank_id]).tolist()
         return token_list
 
     def update(
@@ -206,9 +233,17 @@ class WER(Metric):
         scores = 0.0
         references = []
         with torch.no_grad():
-            # prediction_cpu_tensor = tensors[0].long().cpu()
-            targets_cpu_tensor = targets.long().cpu()
-            tgt_lenths_cpu_tensor = target_lengths.long().cpu()
+            # The targets are copied to CPU asynchronously, the copy overlaps with the decoding of the predictions
+            targets_cpu_tensor = targets.to('cpu', dtype=torch.long, non_blocking=True)
+            tgt_lenths_cpu_tensor = target_lengths.to('cpu', dtype=torch.long, non_blocking=True)
+            if self.ctc_decode:
+                hypotheses = self.ctc_decoder_predictions_tensor(predictions, predictions_lengths)
+            else:
+                raise NotImplementedError("Implement me if you need non-CTC decode on predictions")
+            # Only waits for the devices the copies come from, not for every GPU visible to the process
+            for tensor in (targets, target_lengths):
+                if tensor.is_cuda:
+                    torch.cuda.synchronize(tensor.device)
 
             # iterate over batch
             for ind in range(targets_cpu_tensor.shape[self.batch_dim_index]):
@@ -216,26 +251,19 @@ class WER(Metric):
                 target = targets_cpu_tensor[ind][:tgt_len].numpy().tolist()
                 reference = self.decode_tokens_to_str(target)
                 references.append(reference)
-            if self.ctc_decode:
-                hypotheses = self.ctc_decoder_predictions_tensor(predictions, predictions_lengths)
-            else:
-                raise NotImplementedError("Implement me if you need non-CTC decode on predictions")
 
         if self.log_prediction:
             logging.info(f"\n")
             logging.info(f"reference:{references[0]}")
             logging.info(f"predicted:{hypotheses[0]}")
 
-        for h, r in zip(hypotheses, references):
-            if self.use_cer:
-                h_list = list(h)
-                r_list = list(r)
-            else:
-                h_list = h.split()
-                r_list = r.split()
-            words += len(r_list)
-            # Compute Levenstein's distance
-            scores += editdistance.eval(h_list, r_list)
+        if self.use_cer:
+            h_lists, r_lists = hypotheses, references
+        else:
+            h_lists, r_lists = [h.split() for h in hypotheses], [r.split() for r in references]
+        words += sum(map(len, r_lists))
+        # Compute Levenstein's distance of all the pairs at once
+        scores += _sum_edit_distances(h_lists, r_lists)
 
         self.scores = torch.tensor(scores, device=self.scores.device, dtype=self.scores.dtype)
         self.words = torch.tensor(words, device=self.words.device, dtype=self.words.dtype)
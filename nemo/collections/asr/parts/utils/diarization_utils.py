@@ -16,7 +16,7 @@ import csv
 import json
 import os
 from collections import OrderedDict as od
-from datetime import datetime
+from multiprocessing import Pool
 from typing import List
 
 import numpy as np
@@ -35,16 +35,106 @@ from nemo.collections.asr.parts.utils.speaker_utils import (
 )
 from nemo.utils import logging
 
+try:
+    import orjson
+
+    HAVE_ORJSON = True
+except (ImportError, ModuleNotFoundError):
+    HAVE_ORJSON = False
+
+try:
+    from numba import jit
+
+    HAVE_NUMBA = True
+except (ImportError, ModuleNotFoundError):
+    HAVE_NUMBA = False
+
 __all__ = ['ASR_DIAR_OFFLINE']
 
 NONE_LIST = ['None', 'none', 'null', '']
 
+# torch.inference_mode is lighter than torch.no_grad but only exists in torch>=1.9
+_inference_mode = torch.inference_mode if hasattr(torch, 'inference_mode') else torch.no_grad
+
+
+def _get_silence_timestamps_fsm(char_idx, symbol_idx):
+    """
+    Single pass state machine version of ASR_DIAR_OFFLINE._get_silence_timestamps, compiled with numba
+    when numba is available. A silence starts at a symbol frame and ends before the first frame that is
+    neither the symbol nor the space (index 0).
+
+    Returns an int64 array of [start, end] frame indices.
+    """
+    nb_frames = char_idx.shape[0]
+    spaces = np.empty((nb_frames, 2), dtype=np.int64)
+    nb_spaces, idx_state, in_state = 0, 0, False
+    for idx in range(nb_frames):
+        current_char_idx = char_idx[idx]
+        if in_state and current_char_idx != 0 and current_char_idx != symbol_idx:
+            spaces[nb_spaces, 0] = idx_state
+            spaces[nb_spaces, 1] = idx - 1
+            nb_spaces += 1
+            in_state = False
+        if not in_state and current_char_idx == symbol_idx:
+            in_state = True
+            idx_state = idx
+    if in_state:
+        spaces[nb_spaces, 0] = idx_state
+        spaces[nb_spaces, 1] = nb_frames - 1
+        nb_spaces += 1
+    return spaces[:nb_spaces]
+
+
+if HAVE_NUMBA:
+    _get_silence_timestamps_fsm = jit(nopython=True, nogil=True, cache=True)(_get_silence_timestamps_fsm)
+
+
+def _get_silence_timestamps_numpy(char_idx, symbol_idx):
+    """
+    Vectorized version of `_get_silence_timestamps_fsm`, used when numba is not available.
+
+    Returns an int64 array of [start, end] frame indices.
+    """
+    is_symbol = char_idx == symbol_idx
+    # A silence starts at a symbol frame and lasts as long as only the symbol or the space (index 0) is emitted
+    is_silence = np.concatenate(([False], is_symbol | (char_idx == 0), [False]))
+    transitions = np.diff(is_silence.astype(np.int8))
+    run_starts, run_ends = np.flatnonzero(transitions == 1), np.flatnonzero(transitions == -1)
+
+    # The silence of each run begins at the first symbol frame of the run, runs without one are skipped
+    symbol_frames = np.flatnonzero(is_symbol)
+    first_symbol = np.searchsorted(symbol_frames, run_starts)
+    has_symbol = first_symbol < len(symbol_frames)
+    has_symbol[has_symbol] = symbol_frames[first_symbol[has_symbol]] < run_ends[has_symbol]
+
+    spaces = np.stack((symbol_frames[first_symbol[has_symbol]], run_ends[has_symbol] - 1), axis=1)
+    return spaces
+
+
+def _json_default(obj):
+    """Convert numpy scalars and arrays, which json cannot serialize, to python objects.
+    """
+    if isinstance(obj, np.ndarray):
+        return [_json_default(item) for item in obj]
+    if isinstance(obj, np.floating):
+        # orjson writes float16 and float32 values with their shortest float32 representation (e.g. 0.1)
+        return float(str(np.float32(obj))) if obj.itemsize <= 4 else float(obj)
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
 
 def dump_json_to_file(file_path, riva_dict):
     """Write json file from the riva_dict dictionary.
+    orjson is used when it is installed since it is much faster than json. Both paths write the same
+    UTF-8 output with a 2-space indent (the only indent orjson supports) and accept numpy values.
     """
-    with open(file_path, "w") as outfile:
-        json.dump(riva_dict, outfile, indent=4)
+    if HAVE_ORJSON:
+        with open(file_path, "wb") as outfile:
+            outfile.write(orjson.dumps(riva_dict, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY))
+    else:
+        with open(file_path, "w", encoding="utf-8") as outfile:
+            json.dump(riva_dict, outfile, indent=2, ensure_ascii=False, default=_json_default)
 
 
 def write_txt(w_path, val):
@@ -64,13 +154,13 @@ def get_uniq_id_from_audio_path(audio_file_path):
 def get_file_lists(file_list_path):
     """Read file paths from the given list
     """
-    out_path_list = []
     if not file_list_path or (file_list_path in NONE_LIST):
         raise ValueError("file_list_path is not provided.")
     else:
         with open(file_list_path, 'r') as path2file:
-            for _file in path2file.readlines():
-                out_path_list.append(_file.strip())
+            lines = path2file.read().splitlines()
+        # Blank lines (e.g. at the end of the file) are skipped
+        out_path_list = [_file.strip() for _file in lines if _file.strip()]
 
     return out_path_list
 
@@ -104,11 +194,10 @@ class WER_TS(WER):
         return hypothesis, timestamp_list
 
     def decode_ids_to_tokens_with_ts(self, tokens: List[int], timestamps: List[int]) -> List[str]:
-        token_list, timestamp_list = [], []
-        for i, c in enumerate(tokens):
-            if c != self.blank_id:
-                token_list.append(self.labels_map[c])
-                timestamp_list.append(timestamps[i])
+        tokens = np.asarray(tokens, dtype=np.int64)
+        is_label = tokens != self.blank_id
+        token_list = self._vocab_arr.take(tokens[is_label]).tolist()
+        timestamp_list = np.asarray(timestamps, dtype=np.int64)[is_label].tolist()
         return token_list, timestamp_list
 
     def ctc_decoder_predictions_tensor_with_ts(
@@ -119,20 +208,19 @@ class WER_TS(WER):
         Replaced decode_tokens_to_str() function with decode_tokens_to_str_with_ts().
         """
         hypotheses, timestamps = [], []
-        prediction_cpu_tensor = predictions.long().cpu()
-        for ind in range(prediction_cpu_tensor.shape[self.batch_dim_index]):
-            prediction = prediction_cpu_tensor[ind].detach().numpy().tolist()
+        # The predictions are collapsed on their device, only the decoded labels and timestamps are moved to CPU
+        predictions = predictions.long()
+        for ind in range(predictions.shape[self.batch_dim_index]):
+            prediction = predictions[ind].detach()
             if predictions_len is not None:
                 prediction = prediction[: predictions_len[ind]]
 
-            # CTC decoding procedure with timestamps
-            decoded_prediction, decoded_timing_list = [], []
-            previous = self.blank_id
-            for pdx, p in enumerate(prediction):
-                if (p != previous or previous == self.blank_id) and p != self.blank_id:
-                    decoded_prediction.append(p)
-                    decoded_timing_list.append(pdx)
-                previous = p
+            # CTC decoding procedure with timestamps: the timestamp of a label is the first frame of its run
+            merged_prediction, run_lengths = torch.unique_consecutive(prediction, return_counts=True)
+            run_starts = torch.cumsum(run_lengths, dim=0) - run_lengths
+            is_label = merged_prediction != self.blank_id
+            decoded_prediction = merged_prediction[is_label].cpu().tolist()
+            decoded_timing_list = run_starts[is_label].cpu().tolist()
 
             text, timestamp_list = self.decode_tokens_to_str_with_ts(decoded_prediction, decoded_timing_list)
             hypotheses.append(text)
@@ -198,8 +286,6 @@ class ASR_DIAR_OFFLINE(object):
             audio_file_list (list):
                 The list of audio file paths.
         """
-        trans_logit_timestamps_list = []
-
         # A part of decoder instance
         wer_ts = WER_TS(
             vocabulary=_asr_model.decoder.vocabulary,
@@ -210,24 +296,22 @@ class ASR_DIAR_OFFLINE(object):
             log_prediction=_asr_model._cfg.get("log_prediction", False),
         )
 
-        with torch.cuda.amp.autocast():
-            transcript_logits_list = _asr_model.transcribe(audio_file_list, batch_size=1, logprobs=True)
-            for logit_np in transcript_logits_list:
-                log_prob = torch.from_numpy(logit_np)
-                logits_len = torch.from_numpy(np.array([log_prob.shape[0]]))
-                greedy_predictions = log_prob.argmax(dim=-1, keepdim=False).unsqueeze(0)
-                text, ts = wer_ts.ctc_decoder_predictions_tensor_with_ts(
-                    greedy_predictions, predictions_len=logits_len
-                )
-                trans_logit_timestamps_list.append([text[0], logit_np, ts[0]])
+        # Only the model forward runs in mixed precision, the decoding is done on the returned FP32 logits
+        use_cuda = next(_asr_model.parameters()).is_cuda
+        with _inference_mode(), torch.cuda.amp.autocast(enabled=use_cuda):
+            transcript_logits_list = _asr_model.transcribe(
+                audio_file_list, batch_size=self.params.get('asr_batch_size', 1), logprobs=True
+            )
+        if use_cuda:
+            # The logits are on CPU, release the cached activations before diarization loads its models
+            torch.cuda.empty_cache()
+        trans_logit_timestamps_list = self._decode_logits_with_ts(wer_ts, transcript_logits_list)
         return trans_logit_timestamps_list
 
     def run_ASR_Conformer_CTC(self, _asr_model, audio_file_list):
         """
         Not implemented Yet
         """
-        trans_logit_timestamps_list = []
-
         # A part of decoder instance
         wer_ts = WER_TS(
             vocabulary=_asr_model.decoder.vocabulary,
@@ -238,18 +322,38 @@ class ASR_DIAR_OFFLINE(object):
             log_prediction=_asr_model._cfg.get("log_prediction", False),
         )
 
-        with torch.cuda.amp.autocast():
-            transcript_logits_list = _asr_model.transcribe(audio_file_list, batch_size=1, logprobs=True)
-            for logit_np in transcript_logits_list:
-                log_prob = torch.from_numpy(logit_np)
-                logits_len = torch.from_numpy(np.array([log_prob.shape[0]]))
-                greedy_predictions = log_prob.argmax(dim=-1, keepdim=False).unsqueeze(0)
-                text, ts = wer_ts.ctc_decoder_predictions_tensor_with_ts(
-                    greedy_predictions, predictions_len=logits_len
-                )
-                trans_logit_timestamps_list.append([text[0], logit_np, ts[0]])
+        # Only the model forward runs in mixed precision, the decoding is done on the returned FP32 logits
+        use_cuda = next(_asr_model.parameters()).is_cuda
+        with _inference_mode(), torch.cuda.amp.autocast(enabled=use_cuda):
+            transcript_logits_list = _asr_model.transcribe(
+                audio_file_list, batch_size=self.params.get('asr_batch_size', 1), logprobs=True
+            )
+        if use_cuda:
+            # The logits are on CPU, release the cached activations before diarization loads its models
+            torch.cuda.empty_cache()
+        trans_logit_timestamps_list = self._decode_logits_with_ts(wer_ts, transcript_logits_list)
         return trans_logit_timestamps_list
 
+    @staticmethod
+    def _decode_logits_with_ts(wer_ts, transcript_logits_list):
+        """
+        Greedy decode the logits of all the audio files with a single decoder call.
+
+        Args:
+            wer_ts (WER_TS):
+                The decoder instance.
+            transcript_logits_list (list):
+                The list of logit values (numpy.array) of each audio file.
+        """
+        if len(transcript_logits_list) == 0:
+            return []
+        greedy_predictions = torch.nn.utils.rnn.pad_sequence(
+            [torch.from_numpy(logit_np).argmax(dim=-1) for logit_np in transcript_logits_list], batch_first=True
+        )
+        logits_len = torch.tensor([logit_np.shape[0] for logit_np in transcript_logits_list])
+        text, ts = wer_ts.ctc_decoder_predictions_tensor_with_ts(greedy_predictions, predictions_len=logits_len)
+        return [[text[k], logit_np, ts[k]] for k, logit_np in enumerate(transcript_logits_list)]
+
     def get_speech_labels_list(self, transcript_logits_list, audio_file_list):
         """
         Get non_speech labels from logit output. The logit output is obtained from
@@ -261,67 +365,69 @@ class ASR_DIAR_OFFLINE(object):
             audio_file_list (list):
                 The list of audio file paths.
         """
-        trans_words_list, spaces_list, word_ts_list = [], [], []
-        for i, (trans, logit, timestamps) in enumerate(transcript_logits_list):
-
-            AUDIO_FILENAME = audio_file_list[i]
-            probs = self.softmax(logit)
+        args = [
+            (trans, logit, timestamps, audio_file_path)
+            for (trans, logit, timestamps), audio_file_path in zip(transcript_logits_list, audio_file_list)
+        ]
+        results = self._starmap(self._get_speech_labels_per_file, args)
+        trans_words_list = [trans_words for trans_words, _, _ in results]
+        spaces_list = [spaces for _, spaces, _ in results]
+        word_ts_list = [word_ts for _, _, word_ts in results]
+        return trans_words_list, spaces_list, word_ts_list
 
-            _trans, _timestamps = self.clean_trans_and_TS(trans, timestamps)
-            _spaces, _trans_words = self._get_spaces(_trans, _timestamps)
+    def _get_speech_labels_per_file(self, trans, logit, timestamps, AUDIO_FILENAME):
+        """
+        Get the words, spaces and word timestamps of a single audio file and write its VAD rttm file.
+        """
+        _trans, _timestamps = self.clean_trans_and_TS(trans, timestamps)
+        _spaces, _trans_words = self._get_spaces(_trans, _timestamps)
 
-            if not self.params['external_oracle_vad']:
-                blanks = self._get_silence_timestamps(probs, symbol_idx=28, state_symbol='blank')
-                non_speech = self.threshold_non_speech(blanks, self.params)
+        if not self.params['external_oracle_vad']:
+            # The argmax of the logits is the argmax of the probabilities, so no softmax is needed.
+            # It is computed once here so that it can be shared by other symbols.
+            char_idx = np.argmax(logit, axis=1)
+            blanks = self._get_silence_timestamps(char_idx, symbol_idx=28)
+            non_speech = self.threshold_non_speech(blanks, self.params)
 
-                speech_labels = self.get_speech_labels_from_nonspeech(probs, non_speech)
-                self.write_VAD_rttm_from_speech_labels(self.root_path, AUDIO_FILENAME, speech_labels)
+            speech_labels = self.get_speech_labels_from_nonspeech(logit, non_speech)
+            self.write_VAD_rttm_from_speech_labels(self.root_path, AUDIO_FILENAME, speech_labels)
 
-            word_timetamps_middle = [[_spaces[k][1], _spaces[k + 1][0]] for k in range(len(_spaces) - 1)]
-            word_timetamps = (
-                [[timestamps[0], _spaces[0][0]]] + word_timetamps_middle + [[_spaces[-1][1], logit.shape[0]]]
-            )
+        word_timetamps_middle = [[_spaces[k][1], _spaces[k + 1][0]] for k in range(len(_spaces) - 1)]
+        word_timetamps = [[timestamps[0], _spaces[0][0]]] + word_timetamps_middle + [[_spaces[-1][1], logit.shape[0]]]
 
-            word_ts_list.append(word_timetamps)
-            spaces_list.append(_spaces)
-            trans_words_list.append(_trans_words)
+        assert len(_trans_words) == len(word_timetamps)
 
-            assert len(_trans_words) == len(word_timetamps)
+        return _trans_words, _spaces, word_timetamps
 
-        return trans_words_list, spaces_list, word_ts_list
+    def _starmap(self, func, args):
+        """
+        Applies func to each tuple of args. The audio files are processed independently, so they are
+        distributed over params['num_workers'] processes when it is greater than 1.
+        """
+        num_workers = self.params.get('num_workers', 1)
+        if num_workers <= 1 or len(args) <= 1:
+            return [func(*arg) for arg in args]
+        p = Pool(processes=num_workers)
+        results = p.starmap(func, args)
+        p.close()
+        p.join()
+        return results
 
     @staticmethod
-    def _get_silence_timestamps(probs, symbol_idx, state_symbol):
+    def _get_silence_timestamps(char_idx, symbol_idx):
         """
         Get timestamps for blanks or spaces (for CTC decoder).
 
         Args:
+            char_idx: (numpy.array)
+                The argmax of the logit values at each frame.
             symbol_idx: (int)
                 symbol index of blank or space in the ASR decoder.
-            state_symbol: (str)
-                The string that indicates the current state.
         """
-        spaces = []
-        idx_state = 0
-        state = ''
-
-        if np.argmax(probs[0]) == symbol_idx:
-            state = state_symbol
-
-        for idx in range(1, probs.shape[0]):
-            current_char_idx = np.argmax(probs[idx])
-            if state == state_symbol and current_char_idx != 0 and current_char_idx != symbol_idx:
-                spaces.append([idx_state, idx - 1])
-                state = ''
-            if state == '':
-                if current_char_idx == symbol_idx:
-                    state = state_symbol
-                    idx_state = idx
-
-        if state == state_symbol:
-            spaces.append([idx_state, len(probs) - 1])
-
-        return spaces
+        char_idx = np.asarray(char_idx, dtype=np.int64)
+        if HAVE_NUMBA:
+            return _get_silence_timestamps_fsm(char_idx, symbol_idx).tolist()
+        return _get_silence_timestamps_numpy(char_idx, symbol_idx).tolist()
 
     def run_diarization(self, audio_file_list, oracle_manifest, oracle_num_speakers, pretrained_speaker_model):
         """
@@ -467,53 +573,63 @@ class ASR_DIAR_OFFLINE(object):
                     end: End of the word in sec.
 
         """
+        args = list(zip(audio_file_list, diar_labels, word_list, word_ts_list))
+        results = self._starmap(self._write_json_and_transcript_per_file, args)
         total_riva_dict = {}
-        for k, audio_file_path in enumerate(audio_file_list):
-            uniq_id = get_uniq_id_from_audio_path(audio_file_path)
-            labels = diar_labels[k]
-            audacity_label_words = []
-            n_spk = self.get_num_of_spk_from_labels(labels)
-            string_out = ''
-            riva_dict = od(
-                {
-                    'status': 'Success',
-                    'session_id': uniq_id,
-                    'transcription': ' '.join(word_list[k]),
-                    'speaker_count': n_spk,
-                    'words': [],
-                }
-            )
+        for (uniq_id, riva_dict), word_ts in zip(results, word_ts_list):
+            # Sessions without any word are not part of the result
+            if len(word_ts) > 0:
+                total_riva_dict[uniq_id] = riva_dict
+        return total_riva_dict
 
-            start_point, end_point, speaker = labels[0].split()
-            words = word_list[k]
+    def _write_json_and_transcript_per_file(self, audio_file_path, labels, words, word_ts):
+        """
+        Matches the diarization result with ASR output for a single audio file and writes the output files.
+        """
+        uniq_id = get_uniq_id_from_audio_path(audio_file_path)
+        audacity_label_words = []
+        n_spk = self.get_num_of_spk_from_labels(labels)
+        string_out = ''
+        riva_dict = od(
+            {
+                'status': 'Success',
+                'session_id': uniq_id,
+                'transcription': ' '.join(words),
+                'speaker_count': n_spk,
+                'words': [],
+            }
+        )
 
-            logging.info(f"Creating results for Session: {uniq_id} n_spk: {n_spk} ")
-            string_out = self.print_time(string_out, speaker, start_point, end_point, self.params)
+        start_point, end_point, speaker = labels[0].split()
 
-            word_pos, idx = 0, 0
-            for j, word_ts_stt_end in enumerate(word_ts_list[k]):
+        logging.info(f"Creating results for Session: {uniq_id} n_spk: {n_spk} ")
+        string_out = self.print_time(string_out, speaker, start_point, end_point, self.params)
 
-                word_pos = self.params['offset'] + word_ts_stt_end[0] * self.params['time_stride']
-                if word_pos < float(end_point):
-                    string_out = self.print_word(string_out, words[j], self.params)
-                else:
-                    idx += 1
-                    idx = min(idx, len(labels) - 1)
-                    start_point, end_point, speaker = labels[idx].split()
-                    string_out = self.print_time(string_out, speaker, start_point, end_point, self.params)
-                    string_out = self.print_word(string_out, words[j], self.params)
+        # Start and end of all the words in sec, computed at once instead of word by word
+        word_ts_sec = np.asarray(word_ts, dtype=np.float64).reshape(-1, 2)
+        word_ts_sec = (self.params['offset'] + word_ts_sec * self.params['time_stride']).tolist()
+        round_float = self.params['round_float']
 
-                stt_sec, end_sec = self.get_timestamp_in_sec(word_ts_stt_end, self.params)
-                riva_dict = self.add_json_to_dict(riva_dict, words[j], stt_sec, end_sec, speaker)
+        idx, end_point_sec = 0, float(end_point)
+        for j, (word_pos, word_end_pos) in enumerate(word_ts_sec):
 
-                total_riva_dict[uniq_id] = riva_dict
-                audacity_label_words = self.get_audacity_label(
-                    words[j], stt_sec, end_sec, speaker, audacity_label_words
-                )
+            if word_pos < end_point_sec:
+                string_out = self.print_word(string_out, words[j], self.params)
+            else:
+                idx += 1
+                idx = min(idx, len(labels) - 1)
+                start_point, end_point, speaker = labels[idx].split()
+                end_point_sec = float(end_point)
+                string_out = self.print_time(string_out, speaker, start_point, end_point, self.params)
+                string_out = self.print_word(string_out, words[j], self.params)
 
-            self.write_and_log(uniq_id, riva_dict, string_out, audacity_label_words)
+            stt_sec, end_sec = round(word_pos, round_float), round(word_end_pos, round_float)
+            riva_dict = self.add_json_to_dict(riva_dict, words[j], stt_sec, end_sec, speaker)
 
-        return total_riva_dict
+            audacity_label_words = self.get_audacity_label(words[j], stt_sec, end_sec, speaker, audacity_label_words)
+
+        self.write_and_log(uniq_id, riva_dict, string_out, audacity_label_words)
+        return uniq_id, riva_dict
 
     def get_WDER(self, total_riva_dict, DER_result_dict, audio_file_list, ref_labels_list):
         """
@@ -591,7 +707,7 @@ class ASR_DIAR_OFFLINE(object):
 
         Args:
             probs (numpy.array):
-                The logit values converted to softmax values.
+                The logit values or their softmax values, only their length is used.
 
             non_speech (list):
                 The list of timestamps for non-speech regions.
@@ -651,15 +767,15 @@ class ASR_DIAR_OFFLINE(object):
         assert (len(trans) > 0) and (len(timestamps) > 0), "Transcript and timestamps length should not be 0."
         assert len(trans) == len(timestamps), "Transcript and timestamp lengths do not match."
 
-        spaces, word_list = [], []
-        stt_idx = 0
-        for k, s in enumerate(trans):
-            if s == ' ':
-                spaces.append([timestamps[k], timestamps[k + 1] - 1])
-                word_list.append(trans[stt_idx:k])
-                stt_idx = k + 1
-        if len(trans) > stt_idx and trans[stt_idx] != ' ':
-            word_list.append(trans[stt_idx:])
+        # UTF-32 gives one code point per array element, so the array indices are the character indices
+        chars = np.frombuffer(trans.encode('utf-32-le'), dtype=np.uint32)
+        space_idx = np.flatnonzero(chars == ord(' '))
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        spaces = np.stack((timestamps[space_idx], timestamps[space_idx + 1] - 1), axis=1).tolist()
+
+        word_list = trans.split(' ')
+        if word_list[-1] == '':
+            word_list.pop()
 
         return spaces, word_list
 
@@ -769,15 +885,24 @@ class ASR_DIAR_OFFLINE(object):
         audacity_label_words.append(f'{stt_sec}\t{end_sec}\t[{spk}] {word}')
         return audacity_label_words
 
+    @staticmethod
+    def format_time(time_sec, with_hours):
+        """
+        Formats a time in seconds as HH:MM:SS.ff (or MM:SS.ff), truncated to hundredths of a second.
+        """
+        centisecs = int(round(float(time_sec) * 1e6)) // 10000
+        minutes, centisecs = divmod(centisecs, 6000)
+        secs, centisecs = divmod(centisecs, 100)
+        if with_hours:
+            hours, minutes = divmod(minutes, 60)
+            return f"{hours:02d}:{minutes:02d}:{secs:02d}.{centisecs:02d}"
+        return f"{minutes:02d}:{secs:02d}.{centisecs:02d}"
+
     @staticmethod
     def print_time(string_out, speaker, start_point, end_point, params):
-        datetime_offset = 16 * 3600
-        if float(start_point) > 3600:
-            time_str = "%H:%M:%S.%f"
-        else:
-            time_str = "%M:%S.%f"
-        start_point_str = datetime.fromtimestamp(float(start_point) - datetime_offset).strftime(time_str)[:-4]
-        end_point_str = datetime.fromtimestamp(float(end_point) - datetime_offset).strftime(time_str)[:-4]
+        with_hours = float(start_point) > 3600
+        start_point_str = ASR_DIAR_OFFLINE.format_time(start_point, with_hours)
+        end_point_str = ASR_DIAR_OFFLINE.format_time(end_point, with_hours)
         strd = "\n[{} - {}] {}: ".format(start_point_str, end_point_str, speaker)
         if params['print_transcript']:
             print(strd, end=" ")
@@ -792,13 +917,15 @@ class ASR_DIAR_OFFLINE(object):
 
     @staticmethod
     def softmax(logits):
-        e = np.exp(logits - np.max(logits))
-        return e / e.sum(axis=-1).reshape([logits.shape[0], 1])
+        # The result is computed in place in a single buffer, keepdims also handles any number of dimensions
+        e = np.subtract(logits, np.max(logits, axis=-1, keepdims=True))
+        np.exp(e, out=e)
+        e /= e.sum(axis=-1, keepdims=True)
+        return e
 
     @staticmethod
     def get_num_of_spk_from_labels(labels):
-        spk_set = [x.split(' ')[-1].strip() for x in labels]
-        return len(set(spk_set))
+        return len({x.rsplit(' ', 1)[-1].strip() for x in labels})
 
     @staticmethod
     def add_json_to_dict(riva_dict, word, stt, end, speaker):
@@ -12,20 +12,186 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from collections import defaultdict
-from typing import DefaultDict, List
+import multiprocessing as mp
+import sys
+from array import array
+from collections import Counter, defaultdict, namedtuple
+from collections.abc import Sequence
+from functools import lru_cache, partial
+from typing import Callable, DefaultDict, List, Optional, Tuple
+
+import numpy as np
 
 from nemo.collections.nlp.data.text_normalization import constants
 from nemo.collections.nlp.data.text_normalization.utils import (
     basic_tokenize,
     normalize_str,
-    read_data_file,
+    read_data_file_iter,
     remove_puncts,
 )
 from nemo.utils.decorators.experimental import experimental
 
 __all__ = ['TextNormalizationTestDataset']
 
+# Integer codes of the predicted tags, used by `compute_class_accuracy`
+_SAME_TAG_CODE, _PUNCT_TAG_CODE, _I_TRANSFORM_TAG_CODE, _OTHER_TAG_CODE = 0, 1, 2, 3
+
+
+@lru_cache(maxsize=200_000)
+def _tokenize(input_str: str, lang: str) -> Tuple[str, ...]:
+    """
+    Cached version of `basic_tokenize`. The same words (numbers, punctuations, common words)
+    occur many times in a text normalization corpus, so their tokenization is only computed once.
+    Returns a tuple so that the cached value cannot be modified by the caller.
+    """
+    return tuple(basic_tokenize(input_str, lang=lang))
+
+
+def _normalize_for_direction(input_str: str, inst_dir: str, lang: str) -> str:
+    """ Normalizes a string before comparison. Punctuations are ignored for the backward direction (ITN). """
+    if inst_dir == constants.INST_BACKWARD:
+        input_str = remove_puncts(input_str)
+    return normalize_str(input_str, lang)
+
+
+def _encode_tag(tag: str) -> int:
+    """ Maps a predicted tag to its integer code """
+    if constants.SAME_TAG in tag:
+        return _SAME_TAG_CODE
+    if constants.PUNCT_TAG in tag:
+        return _PUNCT_TAG_CODE
+    if tag == constants.I_PREFIX + constants.TRANSFORM_TAG:
+        return _I_TRANSFORM_TAG_CODE
+    return _OTHER_TAG_CODE
+
+
+class _TagCodes(dict):
+    """ Codes of the predicted tags, the tags that are not labels of the tagger are encoded on lookup """
+
+    def __missing__(self, tag: str) -> int:
+        return _encode_tag(tag)
+
+
+# Codes of all the tag labels of the tagger, so that the predicted tags are encoded with a single dict lookup
+_TAG_CODES = _TagCodes((tag, _encode_tag(tag)) for tag in constants.ALL_TAG_LABELS)
+
+
+def _process_inst(inst: Tuple[List[str], List[str], List[str]], mode: str, lang: str) -> List[tuple]:
+    """
+    Creates the examples of a single instance of the raw data file
+
+    Args:
+        inst: the classes, written words and spoken words of the instance (as yielded by `read_data_file_iter`)
+        mode: should be one of the values ['tn', 'itn', 'joint']
+        lang: Language of the instance
+    Returns: a list of examples (direction, input string, targets, classes, number of spans, span starts, span ends)
+    """
+    classes, w_words, s_words = inst
+    # Extract words that are not punctuations
+    (
+        processed_w_words,
+        processed_s_words,
+        processed_classes_tn,
+        processed_classes_itn,
+        processed_nb_spans_tn,
+        processed_nb_spans_itn,
+        w_span_starts,
+        w_span_ends,
+        processed_s_span_starts,
+        processed_s_span_ends,
+    ) = ([], [], [], [], 0, 0, array('i'), array('i'), array('i'), array('i'))
+    # Tokens of the written and spoken sentences, built word by word so that
+    # every word is only tokenized once
+    w_tokens, processed_s_tokens = [], []
+    w_word_idx = 0
+    s_word_idx = 0
+    # The loop runs once per word of the corpus, so the constants and bound methods are looked up only once
+    sil_word, self_word, punct_tag = constants.SIL_WORD, constants.SELF_WORD, constants.PUNCT_TAG
+    extend_w_tokens, extend_s_tokens = w_tokens.extend, processed_s_tokens.extend
+    append_class_tn, append_class_itn = processed_classes_tn.append, processed_classes_itn.append
+    for cls, w_word, s_word in zip(classes, w_words, s_words):
+        w_word_tokens = _tokenize(w_word, lang)
+        extend_w_tokens(w_word_tokens)
+        w_span_starts.append(w_word_idx)
+        w_word_idx += len(w_word_tokens)
+        w_span_ends.append(w_word_idx)
+        processed_nb_spans_tn += 1
+        if s_word == sil_word:
+            append_class_tn(punct_tag)
+            continue
+        if s_word == self_word:
+            # The spoken word is the written word, reuse its tokens
+            s_word, s_word_tokens = w_word, w_word_tokens
+        else:
+            s_word_tokens = _tokenize(s_word, lang)
+        processed_s_words.append(s_word)
+        processed_nb_spans_itn += 1
+        append_class_tn(cls)
+        append_class_itn(cls)
+        extend_s_tokens(s_word_tokens)
+        processed_s_span_starts.append(s_word_idx)
+        s_word_idx += len(s_word_tokens)
+        processed_s_span_ends.append(s_word_idx)
+        processed_w_words.append(w_word)
+    # Create examples
+    examples = []
+    for direction in constants.INST_DIRECTIONS:
+        if direction == constants.INST_BACKWARD:
+            if mode == constants.TN_MODE:
+                continue
+            examples.append(
+                (
+                    direction,
+                    ' '.join(processed_s_tokens),
+                    processed_w_words,
+                    processed_classes_itn,
+                    processed_nb_spans_itn,
+                    processed_s_span_starts,
+                    processed_s_span_ends,
+                )
+            )
+        if direction == constants.INST_FORWARD:
+            if mode == constants.ITN_MODE:
+                continue
+            examples.append(
+                (
+                    direction,
+                    ' '.join(w_tokens),
+                    processed_s_words,
+                    processed_classes_tn,
+                    processed_nb_spans_tn,
+                    w_span_starts,
+                    w_span_ends,
+                )
+            )
+    return examples
+
+
+class _ExampleFieldView(Sequence):
+    """
+    Read-only sequence of one field of all the examples of a dataset. The field of an example is
+    only built when it is accessed, so indexing does not depend on the number of examples.
+    """
+
+    __slots__ = ('_get_field', '_nb_examples')
+
+    def __init__(self, get_field: Callable[[int], list], nb_examples: int):
+        self._get_field = get_field
+        self._nb_examples = nb_examples
+
+    def __len__(self):
+        return self._nb_examples
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self._get_field(i) for i in range(*idx.indices(self._nb_examples))]
+        if idx < 0:
+            idx += self._nb_examples
+        if not 0 <= idx < self._nb_examples:
+            raise IndexError('Example index out of range')
+        return self._get_field(idx)
+
+
 # Test Dataset
 @experimental
 class TextNormalizationTestDataset:
@@ -36,102 +202,118 @@ class TextNormalizationTestDataset:
         input_file: path to the raw data file (e.g., train.tsv). For more info about the data format, refer to the `text_normalization doc <https://github.com/NVIDIA/NeMo/blob/main/docs/source/nlp/text_normalization.rst>`.
         mode: should be one of the values ['tn', 'itn', 'joint'].  `tn` mode is for TN only. `itn` mode is for ITN only. `joint` is for training a system that can do both TN and ITN at the same time.
         lang: Language of the dataset
+        num_workers: number of worker processes used to preprocess the instances (1 means no multiprocessing)
+
+    The span boundaries and classes of all the examples are stored in flat arrays. The lists returned
+    for an example (by `__getitem__`, `get_span_starts`, `get_span_ends` and `get_classes`) are built on
+    access, so modifying them does not modify the dataset.
     """
 
-    def __init__(self, input_file: str, mode: str, lang: str):
+    OUTPUT_TYPE = namedtuple(
+        typename='TextNormalizationTestExample',
+        field_names='direction input target classes nb_spans span_starts span_ends',
+    )
+
+    __slots__ = (
+        'lang',
+        'directions',
+        'inputs',
+        'targets',
+        'nb_spans',
+        '_class_vocab',
+        '_class_names',
+        '_span_starts_flat',
+        '_span_ends_flat',
+        '_class_ids_flat',
+        '_span_offsets',
+    )
+
+    def __init__(self, input_file: str, mode: str, lang: str, num_workers: int = 1):
         self.lang = lang
-        insts = read_data_file(input_file)
+        insts = read_data_file_iter(input_file)
 
         # Build inputs and targets
-        self.directions, self.inputs, self.targets, self.classes, self.nb_spans, self.span_starts, self.span_ends = (
-            [],
-            [],
-            [],
-            [],
-            [],
-            [],
-            [],
-        )
-        for (classes, w_words, s_words) in insts:
-            # Extract words that are not punctuations
-            (
-                processed_w_words,
-                processed_s_words,
-                processed_classes_tn,
-                processed_classes_itn,
-                processed_nb_spans_tn,
-                processed_nb_spans_itn,
-                w_span_starts,
-                w_span_ends,
-                processed_s_span_starts,
-                processed_s_span_ends,
-            ) = ([], [], [], [], 0, 0, [], [], [], [])
-            w_word_idx = 0
-            s_word_idx = 0
-            for cls, w_word, s_word in zip(classes, w_words, s_words):
-                w_span_starts.append(w_word_idx)
-                w_word_idx += len(basic_tokenize(w_word, lang=self.lang))
-                w_span_ends.append(w_word_idx)
-                processed_nb_spans_tn += 1
-                if s_word == constants.SIL_WORD:
-                    processed_classes_tn.append(constants.PUNCT_TAG)
-                    continue
-                if s_word == constants.SELF_WORD:
-                    processed_s_words.append(w_word)
-                if not s_word in constants.SPECIAL_WORDS:
-                    processed_s_words.append(s_word)
-                processed_nb_spans_itn += 1
-                processed_classes_tn.append(cls)
-                processed_classes_itn.append(cls)
-                processed_s_span_starts.append(s_word_idx)
-                s_word_idx += len(basic_tokenize(processed_s_words[-1], lang=self.lang))
-                processed_s_span_ends.append(s_word_idx)
-                processed_w_words.append(w_word)
-            # Create examples
-            for direction in constants.INST_DIRECTIONS:
-                if direction == constants.INST_BACKWARD:
-                    if mode == constants.TN_MODE:
-                        continue
-                    input_words = processed_s_words
-                    output_words = processed_w_words
-                    self.span_starts.append(processed_s_span_starts)
-                    self.span_ends.append(processed_s_span_ends)
-                    self.classes.append(processed_classes_itn)
-                    self.nb_spans.append(processed_nb_spans_itn)
-                if direction == constants.INST_FORWARD:
-                    if mode == constants.ITN_MODE:
-                        continue
-                    input_words = w_words
-                    output_words = processed_s_words
-                    self.span_starts.append(w_span_starts)
-                    self.span_ends.append(w_span_ends)
-                    self.classes.append(processed_classes_tn)
-                    self.nb_spans.append(processed_nb_spans_tn)
-                # Basic tokenization
-                input_words = basic_tokenize(' '.join(input_words), lang)
-                # Update self.directions, self.inputs, self.targets
-                self.directions.append(direction)
-                self.inputs.append(' '.join(input_words))
-                self.targets.append(
-                    output_words
-                )  # is list of lists where inner list contains target tokens (not words)
-        self.examples = list(
-            zip(
-                self.directions,
-                self.inputs,
-                self.targets,
-                self.classes,
-                self.nb_spans,
-                self.span_starts,
-                self.span_ends,
-            )
-        )
+        self.directions, self.inputs, self.targets, self.nb_spans = [], [], [], []
+        # The span boundaries and classes of all the examples are concatenated into flat arrays,
+        # the ones of the i-th example are in [span_offsets[i], span_offsets[i + 1])
+        span_starts, span_ends, class_ids, span_offsets = array('i'), array('i'), array('i'), array('q', [0])
+        self._class_vocab = {}
+        process_inst = partial(_process_inst, mode=mode, lang=lang)
+        pool = mp.Pool(num_workers) if num_workers > 1 else None
+        try:
+            # Instances are streamed from the file instead of being loaded all at once
+            if pool is None:
+                processed_insts = map(process_inst, insts)
+            else:
+                processed_insts = pool.imap(process_inst, insts, chunksize=256)
+            for examples in processed_insts:
+                for direction, input_str, targets, classes, nb_spans, cur_span_starts, cur_span_ends in examples:
+                    span_starts.extend(cur_span_starts)
+                    span_ends.extend(cur_span_ends)
+                    class_ids.extend(self._class_vocab.setdefault(cls, len(self._class_vocab)) for cls in classes)
+                    span_offsets.append(len(span_starts))
+                    # Update self.directions, self.inputs, self.targets
+                    self.directions.append(sys.intern(direction))
+                    self.inputs.append(input_str)
+                    # targets is a list of lists where inner list contains target tokens (not words)
+                    self.targets.append(targets)
+                    self.nb_spans.append(nb_spans)
+        finally:
+            if pool is not None:
+                pool.terminate()
+        self._span_starts_flat = np.array(span_starts, dtype=np.int32)
+        self._span_ends_flat = np.array(span_ends, dtype=np.int32)
+        self._class_ids_flat = np.array(class_ids, dtype=np.int32)
+        self._span_offsets = np.array(span_offsets, dtype=np.int64)
+        # Interned so that comparisons with the class constants (e.g. PUNCT_TAG) are identity checks
+        self._class_names = [sys.intern(cls) for cls in self._class_vocab]
+
+    def get_span_starts(self, idx: int) -> List[int]:
+        """ Returns the start word indices of the semiotic spans of the idx-th example """
+        return self._span_starts_flat[self._span_offsets[idx] : self._span_offsets[idx + 1]].tolist()
+
+    def get_span_ends(self, idx: int) -> List[int]:
+        """ Returns the end word indices of the semiotic spans of the idx-th example """
+        return self._span_ends_flat[self._span_offsets[idx] : self._span_offsets[idx + 1]].tolist()
+
+    def get_classes(self, idx: int) -> List[str]:
+        """ Returns the classes of the semiotic spans of the idx-th example """
+        class_ids = self._class_ids_flat[self._span_offsets[idx] : self._span_offsets[idx + 1]]
+        return [self._class_names[class_id] for class_id in class_ids.tolist()]
+
+    @property
+    def span_starts(self) -> Sequence:
+        """ The span starts of all the examples, each item is built on access by `get_span_starts` """
+        return _ExampleFieldView(self.get_span_starts, len(self))
+
+    @property
+    def span_ends(self) -> Sequence:
+        """ The span ends of all the examples, each item is built on access by `get_span_ends` """
+        return _ExampleFieldView(self.get_span_ends, len(self))
+
+    @property
+    def classes(self) -> Sequence:
+        """ The classes of all the examples, each item is built on access by `get_classes` """
+        return _ExampleFieldView(self.get_classes, len(self))
 
     def __getitem__(self, idx):
-        return self.examples[idx]
+        # Examples are assembled on access from the parallel lists instead of being stored twice
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+        if idx < 0:
+            idx += len(self)
+        return self.OUTPUT_TYPE(
+            self.directions[idx],
+            self.inputs[idx],
+            self.targets[idx],
+            self.get_classes(idx),
+            self.nb_spans[idx],
+            self.get_span_starts(idx),
+            self.get_span_ends(idx),
+        )
 
     def __len__(self):
-        return len(self.inputs)
+        return len(self.directions)
 
     @staticmethod
     def is_same(pred: str, target: str, inst_dir: str, lang: str):
@@ -146,15 +328,19 @@ class TextNormalizationTestDataset:
             lang: Language
         Return: an int value (0/1) indicating whether pred and target are the same.
         """
+        # The normalization is inlined since compute_class_accuracy calls this once per class
         if inst_dir == constants.INST_BACKWARD:
-            pred = remove_puncts(pred)
-            target = remove_puncts(target)
-        pred = normalize_str(pred, lang)
-        target = normalize_str(target, lang)
-        return int(pred == target)
+            pred, target = remove_puncts(pred), remove_puncts(target)
+        return int(normalize_str(pred, lang) == normalize_str(target, lang))
 
     @staticmethod
-    def compute_sent_accuracy(preds: List[str], targets: List[str], inst_directions: List[str], lang: str):
+    def compute_sent_accuracy(
+        preds: List[str],
+        targets: List[str],
+        inst_directions: List[str],
+        lang: str,
+        max_length_ratio: Optional[float] = None,
+    ):
         """
         Compute the sentence accuracy metric.
 
@@ -163,6 +349,10 @@ class TextNormalizationTestDataset:
             targets: List of target strings.
             inst_directions: A list of str where each str indicates the direction of the corresponding instance (i.e., INST_BACKWARD or INST_FORWARD).
             lang: Language
+            max_length_ratio: If set, a forward (TN) prediction is counted as wrong without normalizing it when
+                the length of the longest of the prediction and the target exceeds `max_length_ratio` times the
+                length of the shortest one. Since normalization can change the length of a string, this can
+                slightly change the score. Defaults to None (no length prefilter).
         Return: the sentence accuracy score
         """
         assert len(preds) == len(targets)
@@ -171,7 +361,13 @@ class TextNormalizationTestDataset:
         # Sentence Accuracy
         correct_count = 0
         for inst_dir, pred, target in zip(inst_directions, preds, targets):
-            correct_count += TextNormalizationTestDataset.is_same(pred, target, inst_dir, lang)
+            if max_length_ratio is not None and inst_dir == constants.INST_FORWARD:
+                pred_len, target_len = len(pred.strip()), len(target.strip())
+                if max(pred_len, target_len) > max_length_ratio * min(pred_len, target_len):
+                    continue
+            correct_count += _normalize_for_direction(pred, inst_dir, lang) == _normalize_for_direction(
+                target, inst_dir, lang
+            )
         sent_accuracy = correct_count / len(targets)
 
         return sent_accuracy
@@ -209,47 +405,48 @@ class TextNormalizationTestDataset:
         if len(targets) == 0:
             return 'NA'
 
-        class2stats, class2correct = defaultdict(int), defaultdict(int)
-        for ix, (sent, tags) in enumerate(zip(inputs, tag_preds)):
-            cur_words = [[] for _ in range(nb_spans[ix])]
-            jx, span_idx = 0, 0
-            cur_spans = output_spans[ix]
-            class_idx = 0
-            if classes[ix]:
-                class2stats[classes[ix][class_idx]] += 1
-            while jx < len(sent):
-                tag, word = tags[jx], sent[jx]
-                while jx >= span_ends[ix][class_idx]:
+        class2correct = defaultdict(int)
+        # Every class up to the last one reached by the walk over the tags of its sentence is counted once
+        reached_classes = []
+        # Local bindings of the names used in the loops below
+        codes, i_transform_tag_code = _TAG_CODES, _I_TRANSFORM_TAG_CODE
+        punct_tag, is_same = constants.PUNCT_TAG, TextNormalizationTestDataset.is_same
+        for sent, tags, inst_dir, cur_spans, cur_targets, cur_classes, cur_nb_spans, cur_span_ends in zip(
+            inputs, tag_preds, inst_directions, output_spans, targets, classes, nb_spans, span_ends
+        ):
+            # Assign every input word (or decoded span) to the ground truth class it falls into
+            sent_len = len(sent)
+            cur_words = [[] for _ in range(cur_nb_spans)]
+            jx, span_idx, class_idx = 0, 0, 0
+            while jx < sent_len:
+                while jx >= cur_span_ends[class_idx]:
                     class_idx += 1
-                    class2stats[classes[ix][class_idx]] += 1
-                if constants.SAME_TAG in tag:
-                    cur_words[class_idx].append(word)
-                    jx += 1
-                elif constants.PUNCT_TAG in tag:
-                    cur_words[class_idx].append(word)
+                tag_code = codes[tags[jx]]
+                if tag_code == _SAME_TAG_CODE or tag_code == _PUNCT_TAG_CODE:
+                    cur_words[class_idx].append(sent[jx])
                     jx += 1
                 else:
                     jx += 1
-                    tmp = cur_spans[span_idx]
-                    cur_words[class_idx].append(tmp)
+                    span = cur_spans[span_idx]
+                    cur_words[class_idx].append(span)
                     span_idx += 1
-                    while jx < len(sent) and tags[jx] == constants.I_PREFIX + constants.TRANSFORM_TAG:
-                        while jx >= span_ends[ix][class_idx]:
+                    while jx < sent_len and codes[tags[jx]] == i_transform_tag_code:
+                        # A decoded span counts for every class it overlaps
+                        while jx >= cur_span_ends[class_idx]:
                             class_idx += 1
-                            class2stats[classes[ix][class_idx]] += 1
-                            cur_words[class_idx].append(tmp)
+                            cur_words[class_idx].append(span)
                         jx += 1
+            reached_classes.extend(cur_classes[: class_idx + 1])
 
             target_token_idx = 0
-            for class_idx in range(nb_spans[ix]):
-                if classes[ix][class_idx] == constants.PUNCT_TAG:
+            for cur_class, words in zip(cur_classes, cur_words):
+                # The PUNCT classes are not evaluated
+                if cur_class == punct_tag:
                     continue
-                correct = TextNormalizationTestDataset.is_same(
-                    " ".join(cur_words[class_idx]), targets[ix][target_token_idx], inst_directions[ix], lang
-                )
-                class2correct[classes[ix][class_idx]] += correct
+                class2correct[cur_class] += is_same(" ".join(words), cur_targets[target_token_idx], inst_dir, lang)
                 target_token_idx += 1
 
+        class2stats = Counter(reached_classes)
         for key in class2stats:
             class2stats[key] = (class2correct[key] / class2stats[key], class2correct[key], class2stats[key])
 
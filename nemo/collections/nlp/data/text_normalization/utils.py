@@ -12,14 +12,17 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 import string
-from copy import deepcopy
+from functools import lru_cache
 
 from nltk import word_tokenize
 from tqdm import tqdm
 
 from nemo.collections.nlp.data.text_normalization import constants
 
-__all__ = ['read_data_file', 'normalize_str']
+__all__ = ['read_data_file', 'read_data_file_iter', 'normalize_str']
+
+# Translation table used by `remove_puncts`, built once instead of at every call
+_PUNCT_TRANSLATION_TABLE = str.maketrans('', '', string.punctuation)
 
 
 def read_data_file(fp: str, max_insts: int = -1):
@@ -33,37 +36,52 @@ def read_data_file(fp: str, max_insts: int = -1):
     Returns:
         insts: List of sentences parsed as list of words
     """
-    insts, w_words, s_words, classes = [], [], [], []
+    return list(read_data_file_iter(fp, max_insts))
+
+
+def read_data_file_iter(fp: str, max_insts: int = -1):
+    """ Lazily reading the raw data from a file of NeMo format, one sentence at a time.
+    Unlike `read_data_file`, the whole file is never held in memory at once.
+
+    Args:
+        fp: file paths
+        max_insts: Maximum number of instances (-1 means no limit)
+    Yields:
+        inst: A sentence parsed as a tuple (classes, w_words, s_words)
+    """
+    w_words, s_words, classes = [], [], []
+    nb_insts = 0
     # Read input file
     with open(fp, 'r', encoding='utf-8') as f:
         for line in tqdm(f):
             es = [e.strip() for e in line.strip().split('\t')]
             if es[0] == '<eos>':
-                inst = (deepcopy(classes), deepcopy(w_words), deepcopy(s_words))
-                insts.append(inst)
+                yield (classes, w_words, s_words)
+                nb_insts += 1
                 # Reset
                 w_words, s_words, classes = [], [], []
 
-                if max_insts > 0 and len(insts) >= max_insts:
+                if max_insts > 0 and nb_insts >= max_insts:
                     break
             else:
                 classes.append(es[0])
                 w_words.append(es[1])
                 s_words.append(es[2])
-    return insts
 
 
+@lru_cache(maxsize=262144)
 def normalize_str(input_str, lang):
-    """ Normalize an input string """
+    """ Normalize an input string (the results are cached, the same targets are normalized many times) """
     input_str_tokens = basic_tokenize(input_str.strip().lower(), lang)
     input_str = ' '.join(input_str_tokens)
     input_str = input_str.replace('  ', ' ')
     return input_str
 
 
+@lru_cache(maxsize=262144)
 def remove_puncts(input_str):
     """ Remove punctuations from an input string """
-    return input_str.translate(str.maketrans('', '', string.punctuation))
+    return input_str.translate(_PUNCT_TRANSLATION_TABLE)
 
 
 def basic_tokenize(input_str, lang):
@@ -0,0 +1,159 @@
+# Copyright (c) 2021, NVIDIA CORPORATION.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+from collections import OrderedDict as od
+
+import numpy as np
+import pytest
+
+from nemo.collections.asr.parts.utils import diarization_utils
+from nemo.collections.asr.parts.utils.diarization_utils import (
+    ASR_DIAR_OFFLINE,
+    _get_silence_timestamps_fsm,
+    _get_silence_timestamps_numpy,
+    dump_json_to_file,
+)
+
+# In the QuartzNet vocabulary, index 0 is the space and index 28 is the CTC blank
+SPACE_IDX, BLANK_IDX = 0, 28
+
+
+def _reference_silence_timestamps(char_idx, symbol_idx):
+    """ The original frame by frame loop of ASR_DIAR_OFFLINE._get_silence_timestamps """
+    spaces = []
+    idx_state = 0
+    state = ''
+
+    if char_idx[0] == symbol_idx:
+        state = 'blank'
+
+    for idx in range(1, len(char_idx)):
+        current_char_idx = char_idx[idx]
+        if state == 'blank' and current_char_idx != SPACE_IDX and current_char_idx != symbol_idx:
+            spaces.append([idx_state, idx - 1])
+            state = ''
+        if state == '':
+            if current_char_idx == symbol_idx:
+                state = 'blank'
+                idx_state = idx
+
+    if state == 'blank':
+        spaces.append([idx_state, len(char_idx) - 1])
+
+    return spaces
+
+
+def _random_char_idx(rng):
+    """ Random argmax sequence made of runs of blank, space and other characters """
+    runs = []
+    for _ in range(rng.randint(1, 12)):
+        symbol = rng.choice([BLANK_IDX, SPACE_IDX, rng.randint(1, 27)])
+        runs.append(np.full(rng.randint(1, 6), symbol, dtype=np.int64))
+    return np.concatenate(runs)
+
+
+class TestSilenceTimestamps:
+    @pytest.mark.unit
+    def test_simple(self):
+        char_idx = np.array([28, 28, 0, 5, 28, 7, 0, 28, 28, 0])
+        expected = [[0, 2], [4, 4], [7, 9]]
+        assert _reference_silence_timestamps(char_idx, BLANK_IDX) == expected
+        assert ASR_DIAR_OFFLINE._get_silence_timestamps(char_idx, BLANK_IDX) == expected
+
+    @pytest.mark.unit
+    def test_implementations_match_reference(self):
+        # The numba kernel is tested through its python function so that both implementations run in CI
+        fsm = getattr(_get_silence_timestamps_fsm, 'py_func', _get_silence_timestamps_fsm)
+        rng = np.random.RandomState(0)
+        for _ in range(2000):
+            char_idx = _random_char_idx(rng)
+            expected = _reference_silence_timestamps(char_idx, BLANK_IDX)
+            assert fsm(char_idx, BLANK_IDX).tolist() == expected
+            assert _get_silence_timestamps_numpy(char_idx, BLANK_IDX).tolist() == expected
+            assert ASR_DIAR_OFFLINE._get_silence_timestamps(char_idx, BLANK_IDX) == expected
+
+
+class TestFormatTime:
+    @pytest.mark.unit
+    @pytest.mark.parametrize(
+        'time_sec, with_hours, expected',
+        [
+            (0, False, '00:00.00'),
+            (65.12, False, '01:05.12'),
+            # Times are truncated to hundredths of a second, not rounded
+            (1.999, False, '00:01.99'),
+            # 0.29 is 0.28999... as a float, it must not be truncated to 0.28
+            (0.29, False, '00:00.29'),
+            (3725.5, True, '01:02:05.50'),
+            (59.999, True, '00:00:59.99'),
+            # Without hours the minutes keep counting past the hour
+            (3600, False, '60:00.00'),
+            (3725.5, False, '62:05.50'),
+        ],
+    )
+    def test_format_time(self, time_sec, with_hours, expected):
+        assert ASR_DIAR_OFFLINE.format_time(time_sec, with_hours) == expected
+
+    @pytest.mark.unit
+    def test_print_time(self):
+        params = {'print_transcript': False}
+        string_out = ASR_DIAR_OFFLINE.print_time('', 'speaker_0', 3725.5, 3727.257, params)
+        assert string_out == '\n[01:02:05.50 - 01:02:07.25] speaker_0: '
+        # The format is chosen by the start of the turn, so a turn starting before the hour shows 60:00.00
+        string_out = ASR_DIAR_OFFLINE.print_time(string_out, 'speaker_1', 3599.5, 3600.0, params)
+        assert string_out.endswith('\n[59:59.50 - 60:00.00] speaker_1: ')
+
+
+def _riva_dict():
+    """ A transcript dictionary holding numpy values, as produced from the model outputs """
+    return od(
+        status='success',
+        transcription='привет there',
+        speaker_count=np.int64(2),
+        words=[
+            {'word': 'привет', 'start_time': np.float32(0.1), 'end_time': 0.35, 'speaker_label': 'speaker_0'},
+            {'word': 'there', 'start_time': np.float64(1.25), 'end_time': np.array([1.5]), 'speaker_label': None},
+        ],
+    )
+
+
+class TestDumpJsonToFile:
+    @pytest.mark.unit
+    def test_dump_json_to_file_without_orjson(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(diarization_utils, 'HAVE_ORJSON', False)
+        file_path = str(tmp_path / 'out.json')
+        dump_json_to_file(file_path, _riva_dict())
+        with open(file_path, encoding='utf-8') as f:
+            text = f.read()
+        assert text.startswith('{\n  "status": "success",\n')
+        assert json.loads(text) == {
+            'status': 'success',
+            'transcription': 'привет there',
+            'speaker_count': 2,
+            'words': [
+                {'word': 'привет', 'start_time': 0.1, 'end_time': 0.35, 'speaker_label': 'speaker_0'},
+                {'word': 'there', 'start_time': 1.25, 'end_time': [1.5], 'speaker_label': None},
+            ],
+        }
+
+    @pytest.mark.unit
+    @pytest.mark.skipif(not diarization_utils.HAVE_ORJSON, reason='orjson is not installed')
+    def test_dump_json_to_file_same_with_orjson(self, tmp_path, monkeypatch):
+        orjson_path, json_path = str(tmp_path / 'orjson.json'), str(tmp_path / 'json.json')
+        dump_json_to_file(orjson_path, _riva_dict())
+        monkeypatch.setattr(diarization_utils, 'HAVE_ORJSON', False)
+        dump_json_to_file(json_path, _riva_dict())
+        with open(orjson_path, 'rb') as orjson_file, open(json_path, 'rb') as json_file:
+            assert orjson_file.read() == json_file.read()
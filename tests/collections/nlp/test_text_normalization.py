@@ -0,0 +1,184 @@
+# Copyright (c) 2021, NVIDIA CORPORATION.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pytest
+
+from nemo.collections.nlp.data.text_normalization import constants
+from nemo.collections.nlp.data.text_normalization.test_dataset import TextNormalizationTestDataset
+from nemo.collections.nlp.data.text_normalization.utils import read_data_file_iter
+
+# Russian is tokenized by splitting on spaces, so the tests do not need any nltk data
+LANG = constants.RUSSIAN
+
+DATA_FILE_CONTENT = [
+    ['PLAIN', 'the', '<self>'],
+    ['CARDINAL', '123', 'one hundred twenty three'],
+    ['PUNCT', ',', 'sil'],
+    ['DATE', 'jan 5', 'january fifth'],
+    ['<eos>', '<eos>'],
+    ['PLAIN', 'i', '<self>'],
+    ['MONEY', '$5', 'five dollars'],
+    ['PUNCT', '!', 'sil'],
+    ['<eos>', '<eos>'],
+    ['LETTERS', 'nasa', 'n a s a'],
+    ['PLAIN', 'here', '<self>'],
+    ['<eos>', '<eos>'],
+]
+
+
+@pytest.fixture()
+def data_file(tmp_path):
+    data_file = tmp_path / 'test.tsv'
+    data_file.write_text(''.join('\t'.join(line) + '\n' for line in DATA_FILE_CONTENT), encoding='utf-8')
+    return str(data_file)
+
+
+class TestReadDataFileIter:
+    @pytest.mark.unit
+    def test_read_data_file_iter(self, data_file):
+        insts = list(read_data_file_iter(data_file))
+        assert len(insts) == 3
+        assert insts[1] == (['PLAIN', 'MONEY', 'PUNCT'], ['i', '$5', '!'], ['<self>', 'five dollars', 'sil'])
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize('max_insts', [1, 2, 3])
+    def test_read_data_file_iter_max_insts(self, data_file, max_insts):
+        insts = list(read_data_file_iter(data_file, max_insts=max_insts))
+        assert insts == list(read_data_file_iter(data_file))[:max_insts]
+
+
+class TestTextNormalizationTestDataset:
+    @pytest.mark.unit
+    def test_dataset(self, data_file):
+        dataset = TextNormalizationTestDataset(data_file, mode=constants.JOINT_MODE, lang=LANG)
+        # One backward and one forward example per instance
+        assert len(dataset) == 6
+        direction, input_str, targets, classes, nb_spans, span_starts, span_ends = dataset[1]
+        assert direction == constants.INST_FORWARD
+        assert input_str == 'the 123 , jan 5'
+        assert targets == ['the', 'one hundred twenty three', 'january fifth']
+        assert classes == ['PLAIN', 'CARDINAL', 'PUNCT', 'DATE']
+        assert nb_spans == 4
+        assert span_starts == [0, 1, 2, 3]
+        assert span_ends == [1, 2, 3, 5]
+
+    @pytest.mark.unit
+    def test_dataset_example_fields(self, data_file):
+        dataset = TextNormalizationTestDataset(data_file, mode=constants.JOINT_MODE, lang=LANG)
+        span_starts, span_ends, classes = dataset.span_starts, dataset.span_ends, dataset.classes
+        assert len(span_starts) == len(span_ends) == len(classes) == len(dataset)
+        assert span_starts[1] == [0, 1, 2, 3]
+        assert span_ends[-1] == [1, 2]
+        assert classes[-1] == ['LETTERS', 'PLAIN']
+        assert span_ends[1:3] == [[1, 2, 3, 5], [1, 3]]
+        assert all(span_starts)
+        # The fields are built on access, so modifying them does not modify the dataset
+        span_starts[1].append(4)
+        assert dataset.span_starts[1] == [0, 1, 2, 3]
+        with pytest.raises(IndexError):
+            classes[len(dataset)]
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize('mode', constants.MODES)
+    def test_dataset_num_workers(self, data_file, mode):
+        dataset = TextNormalizationTestDataset(data_file, mode=mode, lang=LANG)
+        mp_dataset = TextNormalizationTestDataset(data_file, mode=mode, lang=LANG, num_workers=2)
+        assert list(mp_dataset) == list(dataset)
+
+
+class TestTextNormalizationClassAccuracy:
+    @staticmethod
+    def _compute_class_accuracy(sentences):
+        """ Computes the class accuracy of a list of (words, tags, spans, classes, span ends, targets) """
+        inputs, tag_preds, output_spans, classes, span_ends, targets = map(list, zip(*sentences))
+        return TextNormalizationTestDataset.compute_class_accuracy(
+            inputs=inputs,
+            targets=targets,
+            tag_preds=tag_preds,
+            inst_directions=[constants.INST_FORWARD] * len(sentences),
+            output_spans=output_spans,
+            classes=classes,
+            nb_spans=[len(cur_classes) for cur_classes in classes],
+            span_starts=[[0] + cur_span_ends[:-1] for cur_span_ends in span_ends],
+            span_ends=span_ends,
+            lang=LANG,
+        )
+
+    @pytest.mark.unit
+    def test_class_accuracy(self):
+        sentences = [
+            # The decoded span of '5 kg' covers two classes, so it is compared with the target of both
+            (
+                ['the', '5', 'kg', ',', 'ok'],
+                ['B-SAME', 'B-TRANSFORM', 'I-TRANSFORM', 'B-PUNCT', 'B-SAME'],
+                ['five kilograms'],
+                ['PLAIN', 'CARDINAL', 'MEASURE', 'PUNCT', 'PLAIN'],
+                [1, 2, 3, 4, 5],
+                ['the', 'five', 'kilograms', 'ok'],
+            ),
+            (
+                ['see', '7', '!'],
+                ['B-SAME', 'B-TRANSFORM', 'B-PUNCT'],
+                ['seven'],
+                ['PLAIN', 'CARDINAL', 'PUNCT'],
+                [1, 2, 3],
+                ['see', 'seven'],
+            ),
+        ]
+        class_accuracy = self._compute_class_accuracy(sentences)
+        assert dict(class_accuracy) == {
+            'PLAIN': (1.0, 3, 3),
+            'CARDINAL': (0.5, 1, 2),
+            'MEASURE': (0.0, 0, 1),
+            # PUNCT classes are counted but never evaluated
+            'PUNCT': (0.0, 0, 2),
+        }
+
+    @pytest.mark.unit
+    def test_class_accuracy_multi_word_class(self):
+        # A class spanning several words collects all of them
+        sentences = [
+            (
+                ['on', 'jan', '5', 'now'],
+                ['B-SAME', 'B-TRANSFORM', 'I-TRANSFORM', 'B-SAME'],
+                ['january fifth'],
+                ['PLAIN', 'DATE', 'PLAIN'],
+                [1, 3, 4],
+                ['on', 'january fifth', 'now'],
+            )
+        ]
+        class_accuracy = self._compute_class_accuracy(sentences)
+        assert dict(class_accuracy) == {'PLAIN': (1.0, 2, 2), 'DATE': (1.0, 1, 1)}
+
+    @pytest.mark.unit
+    def test_class_accuracy_unknown_tags(self):
+        # Tags that are not labels of the tagger are matched like the original substring tests
+        sentences = [
+            (
+                ['a', 'b', 'c', '!'],
+                ['X-SAME', 'B-OTHER', 'I-OTHER', 'X-PUNCT'],
+                ['bee', 'sea'],
+                ['PLAIN', 'PLAIN', 'PLAIN', 'PUNCT'],
+                [1, 2, 3, 4],
+                ['a', 'bee', 'sea'],
+            )
+        ]
+        class_accuracy = self._compute_class_accuracy(sentences)
+        assert dict(class_accuracy) == {'PLAIN': (1.0, 3, 3), 'PUNCT': (0.0, 0, 1)}
+
+    @pytest.mark.unit
+    def test_class_accuracy_words_past_last_span(self):
+        sentences = [(['a', 'b'], ['B-SAME', 'B-SAME'], [], ['PLAIN'], [1], ['a'])]
+        with pytest.raises(IndexError):
+            self._compute_class_accuracy(sentences)